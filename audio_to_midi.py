@@ -11,7 +11,14 @@ def save_midi_with_directory(mid, output_file):
         os.makedirs(output_dir, exist_ok=True)
     mid.save(output_file)
 
-def audio_to_midi(input_file, output_file, bpm, note, velocity, dynamic):
+def detect_onsets(onset_env, sr, hop_length=512, delta=0.07, wait=0.03, backtrack=False):
+    """Pick onset frames from an onset strength envelope (wait is in seconds)."""
+    return librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr, hop_length=hop_length,
+                                      delta=delta, wait=int(wait * sr // hop_length),
+                                      backtrack=backtrack)
+
+def audio_to_midi(input_file, output_file, bpm, note, velocity, dynamic,
+                  hop_length=512, delta=0.07, wait=0.03, backtrack=False):
     print(f"Loading {input_file}...")
     try:
         y, sr = librosa.load(input_file)
@@ -20,9 +27,14 @@ def audio_to_midi(input_file, output_file, bpm, note, velocity, dynamic):
         return
     
     print("Analyzing audio for onsets...")
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-    onset_frames = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr)
-    onset_times = librosa.frames_to_time(onset_frames, sr=sr)
+    onset_env = librosa.onset.onset_strength(y=y, sr=sr, hop_length=hop_length)
+    peak_frames = detect_onsets(onset_env, sr, hop_length, delta, wait)
+    # Backtracking only moves the note times; velocity still reads the peak
+    if backtrack:
+        onset_frames = librosa.onset.onset_backtrack(peak_frames, onset_env)
+    else:
+        onset_frames = peak_frames
+    onset_times = librosa.frames_to_time(onset_frames, sr=sr, hop_length=hop_length)
     
     # Create MIDI file
     mid = mido.MidiFile()
@@ -43,7 +55,7 @@ def audio_to_midi(input_file, output_file, bpm, note, velocity, dynamic):
     for i, t in enumerate(onset_times):
         current_velocity = velocity
         if dynamic:
-            frame_idx = onset_frames[i]
+            frame_idx = peak_frames[i]
             if frame_idx < len(onset_env):
                 strength = onset_env[frame_idx]
                 norm_strength = strength / max_strength if max_strength > 0 else 0
@@ -80,7 +92,12 @@ if __name__ == "__main__":
     parser.add_argument("--note", "-n", type=int, default=36, help="MIDI note number")
     parser.add_argument("--velocity", "-v", type=int, default=90, help="Velocity")
     parser.add_argument("--dynamic", action="store_true", help="Enable dynamic velocity")
+    parser.add_argument("--hop-length", type=int, default=512, help="Onset analysis hop length in samples")
+    parser.add_argument("--delta", type=float, default=0.07, help="Onset peak-pick threshold")
+    parser.add_argument("--wait", type=float, default=0.03, help="Minimum seconds between onsets")
+    parser.add_argument("--backtrack", action="store_true", help="Move onsets back to the preceding energy minimum")
     
     args = parser.parse_args()
     
-    audio_to_midi(args.input, args.output, args.bpm, args.note, args.velocity, args.dynamic)
\ No newline at end of file
+    audio_to_midi(args.input, args.output, args.bpm, args.note, args.velocity, args.dynamic,
+                  args.hop_length, args.delta, args.wait, args.backtrack)
\ No newline at end of file
@@ -4,18 +4,49 @@ import pygame
 import numpy as np
 import time
 import sys
+import threading
+from collections import deque
+
+def read_note_events(midi_file, bpm):
+    """Return ticks per beat and note on/off events timed in seconds at bpm"""
+    mid = mido.MidiFile(midi_file)
+    events = []
+    
+    # Extract all note on/off events with timing
+    time_in_ticks = 0
+    for track in mid.tracks:
+        for msg in track:
+            time_in_ticks += msg.time
+            if msg.type in ['note_on', 'note_off']:
+                # Convert ticks to seconds
+                time_in_seconds = (time_in_ticks / mid.ticks_per_beat) * (60 / bpm)
+                events.append({
+                    'time': time_in_seconds,
+                    'type': msg.type,
+                    'note': msg.note,
+                    'velocity': msg.velocity
+                })
+    
+    # Sort events by time
+    events.sort(key=lambda x: x['time'])
+    return mid.ticks_per_beat, events
 
 class RSharp:
-    def __init__(self, midi_file, audio_file=None, bpm=120):
+    def __init__(self, midi_file, audio_file=None, bpm=120, live_input=None):
         self.midi_file = midi_file
         self.audio_file = audio_file
         self.bpm = bpm
+        self.live_input = live_input
         self.events = []
         self.event_index = 0
         self.current_time = 0
         self.running = False
         self.visual_effects = []
         
+        # Open live input first so a bad port exits before the window opens
+        if self.live_input is not None:
+            self.open_live_input()
+        
         # Initialize pygame
         pygame.init()
         self.screen_width = 800
@@ -23,8 +54,9 @@ class RSharp:
         self.screen = pygame.display.set_mode((self.screen_width, self.screen_height))
         pygame.display.set_caption("R# - MIDI Visualizer")
         
-        # Load MIDI file
-        self.load_midi_file()
+        # Load MIDI file (live mode receives events from the input instead)
+        if self.live_input is None:
+            self.load_midi_file()
         
         # Setup clock
         self.clock = pygame.time.Clock()
@@ -32,32 +64,21 @@ class RSharp:
     def load_midi_file(self):
         """Load and parse MIDI file events"""
         try:
-            mid = mido.MidiFile(self.midi_file)
-            self.ticks_per_beat = mid.ticks_per_beat
-            
-            # Extract all note on/off events with timing
-            time_in_ticks = 0
-            for track in mid.tracks:
-                for msg in track:
-                    time_in_ticks += msg.time
-                    if msg.type in ['note_on', 'note_off']:
-                        # Convert ticks to seconds
-                        time_in_seconds = (time_in_ticks / self.ticks_per_beat) * (60 / self.bpm)
-                        self.events.append({
-                            'time': time_in_seconds,
-                            'type': msg.type,
-                            'note': msg.note,
-                            'velocity': msg.velocity
-                        })
-            
-            # Sort events by time
-            self.events.sort(key=lambda x: x['time'])
+            self.ticks_per_beat, self.events = read_note_events(self.midi_file, self.bpm)
             print(f"Loaded MIDI file with {len(self.events)} events")
             
         except Exception as e:
             print(f"Error loading MIDI file: {e}")
             sys.exit(1)
             
+    def open_live_input(self):
+        """Open the live MIDI input (port or replay file)"""
+        try:
+            self.live_input.open()
+        except Exception as e:
+            print(f"Error opening MIDI input: {e}")
+            sys.exit(1)
+            
     def add_visual_effect(self, effect):
         """Add a visual effect to the scene"""
         self.visual_effects.append(effect)
@@ -66,6 +87,8 @@ class RSharp:
         """Reset the visualizer state"""
         self.event_index = 0
         self.current_time = 0
+        if self.live_input:
+            self.live_input.reset()
         if self.audio_file:
             try:
                 pygame.mixer.music.play()
@@ -76,23 +99,29 @@ class RSharp:
             effect.reset()
         
     def process_events(self):
-        """Process MIDI events based on current time"""
+        """Process MIDI events based on current time (or live input)"""
         # Find all events that should be triggered now
         triggered_events = []
         
-        while self.event_index < len(self.events):
-            event = self.events[self.event_index]
-            if event['time'] <= self.current_time:
-                triggered_events.append(event)
-                self.event_index += 1
-            else:
-                break
+        if self.live_input:
+            # Take whatever the reader thread has queued, never block
+            triggered_events = self.live_input.drain()
+        else:
+            while self.event_index < len(self.events):
+                event = self.events[self.event_index]
+                if event['time'] <= self.current_time:
+                    triggered_events.append(event)
+                    self.event_index += 1
+                else:
+                    break
                 
         # Trigger visual effects for each event
         for event in triggered_events:
             for effect in self.visual_effects:
                 effect.trigger(event)
                 
+        return triggered_events
+                
     def update(self):
         """Update all visual effects"""
         for effect in self.visual_effects:
@@ -110,8 +139,9 @@ class RSharp:
     def run(self):
         """Main loop"""
         self.running = True
-        self.paused = True
-        self.audio_started = False
+        # Live mode starts immediately, there is no file position to hold
+        self.paused = self.live_input is None
+        self.audio_started = self.live_input is not None
         
         if self.audio_file:
             try:
@@ -129,6 +159,9 @@ class RSharp:
         font = pygame.font.Font(None, 24)
         reset_btn_rect = pygame.Rect(10, 10, 80, 30)
         
+        if self.live_input:
+            self.live_input.start()
+        
         while self.running:
             # Handle events
             for event in pygame.event.get():
@@ -139,6 +172,9 @@ class RSharp:
                         self.running = False
                     elif event.key == pygame.K_SPACE:
                         self.paused = not self.paused
+                        if self.live_input:
+                            if self.paused: self.live_input.pause()
+                            else: self.live_input.resume()
                         if self.paused:
                             if self.audio_started and self.audio_file: pygame.mixer.music.pause()
                             last_pause_time = time.time()
@@ -164,6 +200,9 @@ class RSharp:
                             self.audio_started = True
             
             if self.paused:
+                # Drop live hits played while paused so they don't burst on resume
+                if self.live_input:
+                    self.live_input.drain()
                 # Draw paused state overlay
                 msg = "PRESS SPACE TO START" if not self.audio_started else "PAUSED"
                 pause_text = font.render(msg, True, (255, 255, 255))
@@ -176,7 +215,7 @@ class RSharp:
             self.current_time = time.time() - start_time - pause_offset
             
             # Process MIDI events
-            self.process_events()
+            triggered_events = self.process_events()
             
             # Update and render
             self.update()
@@ -189,13 +228,181 @@ class RSharp:
             text_rect = btn_text.get_rect(center=reset_btn_rect.center)
             self.screen.blit(btn_text, text_rect)
             
+            if self.live_input:
+                self.draw_latency(font)
+            
             pygame.display.flip()
             
+            # Events drawn this frame are now on screen
+            if self.live_input:
+                self.live_input.record_presented(triggered_events, time.perf_counter())
+            
             # Cap framerate
             self.clock.tick(60)
             
+        if self.live_input:
+            self.live_input.stop()
+            self.report_latency()
+            
         pygame.quit()
         
+    def draw_latency(self, font):
+        """Draw live input-to-photon latency readout"""
+        stats = self.live_input.latency_stats()
+        if stats['count'] == 0:
+            msg = "LIVE - waiting for input"
+        else:
+            msg = "LIVE - latency avg {:.1f} ms  p95 {:.1f} ms".format(stats['mean'], stats['p95'])
+        text = font.render(msg, True, (200, 200, 200))
+        self.screen.blit(text, (100, 17))
+        
+    def report_latency(self):
+        """Print live input-to-photon latency statistics"""
+        stats = self.live_input.latency_stats()
+        if stats['count'] == 0:
+            print("No live MIDI events were displayed")
+            return
+        print(f"Input-to-photon latency over {stats['count']} events:")
+        print(f"  mean {stats['mean']:.1f} ms, median {stats['p50']:.1f} ms, "
+              f"p95 {stats['p95']:.1f} ms, max {stats['max']:.1f} ms")
+        
+class LiveMidiInput:
+    """Receives MIDI messages as they arrive for live playback
+    
+    Messages are timestamped on arrival (in mido's port callback) and pushed
+    onto a deque. A single producer appending and a single consumer popping
+    from a deque is thread-safe without a lock, so the render loop never
+    waits on the input. Pass replay_file to stream a MIDI file in real time
+    at the given bpm from a background thread instead of opening a port,
+    which stands in for hardware when testing. A replay follows pause,
+    resume and reset; a port can't be paused, so the caller drops what
+    arrives while paused.
+    """
+    def __init__(self, port_name=None, virtual=False, replay_file=None, bpm=120, latency_window=1000):
+        self.port_name = port_name
+        self.virtual = virtual
+        self.replay_file = replay_file
+        self.bpm = bpm
+        self.queue = deque()
+        self.latencies = deque(maxlen=latency_window)
+        self.port = None
+        self.thread = None
+        self.running = False
+        
+        # Replay position, shared with the replay thread under replay_lock
+        self.replay_events = []
+        self.replay_index = 0
+        self.replay_start = 0
+        self.paused_at = None
+        self.replay_lock = threading.Lock()
+        
+    def open(self):
+        """Open the port, or load the replay file"""
+        if self.replay_file is None:
+            self.port = mido.open_input(self.port_name, virtual=self.virtual, callback=self.on_message)
+            print(f"Listening for MIDI on '{self.port.name}'")
+        else:
+            _, self.replay_events = read_note_events(self.replay_file, self.bpm)
+            print(f"Replaying {self.replay_file} as live input")
+            
+    def start(self):
+        """Start queueing input (and the replay thread)"""
+        self.running = True
+        if self.replay_file is not None:
+            self.replay_start = time.perf_counter()
+            self.thread = threading.Thread(target=self.replay_loop, daemon=True)
+            self.thread.start()
+        
+    def stop(self):
+        """Close the input and stop the replay thread"""
+        self.running = False
+        if self.port is not None:
+            self.port.close()
+        if self.thread is not None:
+            self.thread.join()
+            
+    def pause(self):
+        """Hold the replay where it is"""
+        with self.replay_lock:
+            if self.paused_at is None:
+                self.paused_at = time.perf_counter()
+                
+    def resume(self):
+        """Continue the replay from where it was paused"""
+        with self.replay_lock:
+            if self.paused_at is not None:
+                self.replay_start += time.perf_counter() - self.paused_at
+                self.paused_at = None
+                
+    def reset(self):
+        """Restart the replay and discard queued events and latency samples"""
+        with self.replay_lock:
+            self.replay_index = 0
+            self.replay_start = time.perf_counter()
+            self.paused_at = None
+        self.drain()
+        self.latencies.clear()
+        
+    def on_message(self, msg):
+        """Port callback: timestamp the message and queue it"""
+        received = time.perf_counter()
+        # The port is open before the render loop starts; ignore input until then
+        if self.running and msg.type in ['note_on', 'note_off']:
+            self.push(msg.type, msg.note, msg.velocity, received)
+            
+    def replay_loop(self):
+        """Replay thread: queue each event at its time in the file"""
+        while self.running:
+            with self.replay_lock:
+                due = None
+                if self.paused_at is None and self.replay_index < len(self.replay_events):
+                    event = self.replay_events[self.replay_index]
+                    due = self.replay_start + event['time'] - time.perf_counter()
+                    if due <= 0:
+                        self.push(event['type'], event['note'], event['velocity'], time.perf_counter())
+                        self.replay_index += 1
+                        continue
+            # Sleep in short steps so pause, reset and stop take effect quickly
+            time.sleep(0.01 if due is None else min(due, 0.01))
+            
+    def push(self, msg_type, note, velocity, received):
+        """Queue a note event received at the given perf_counter time"""
+        self.queue.append({
+            'time': received,
+            'type': msg_type,
+            'note': note,
+            'velocity': velocity,
+            'received': received
+        })
+            
+    def drain(self):
+        """Return all queued events without blocking"""
+        events = []
+        # Only take what is queued now so a busy input can't stall the frame
+        for _ in range(len(self.queue)):
+            events.append(self.queue.popleft())
+        return events
+        
+    def record_presented(self, events, presented):
+        """Record latency for hits shown on the frame flipped at presented"""
+        for event in events:
+            # Note offs and zero-velocity note ons don't draw anything
+            if event['type'] == 'note_on' and event['velocity'] > 0:
+                self.latencies.append(presented - event['received'])
+            
+    def latency_stats(self):
+        """Latency statistics in milliseconds over the recent window"""
+        if not self.latencies:
+            return {'count': 0}
+        samples = np.array(self.latencies) * 1000
+        return {
+            'count': len(samples),
+            'mean': float(np.mean(samples)),
+            'p50': float(np.percentile(samples, 50)),
+            'p95': float(np.percentile(samples, 95)),
+            'max': float(np.max(samples))
+        }
+        
 class VisualEffect:
     """Base class for visual effects"""
     def __init__(self):
@@ -234,6 +441,104 @@ DRUM_POSITIONS = {
     51: (0.7, 0.4), 59: (0.7, 0.4), 53: (0.65, 0.35)
 }
 
+RENDER_BACKENDS = ['pygame', 'numpy']
+
+class NumpySplatter:
+    """Draws many soft circles at once with NumPy, blended additively
+    
+    Each circle is an antialiased disc stamp for its integer radius, summed
+    into a float buffer covering every circle drawn this frame. Small
+    circles (particles) sharing a radius are merged by centre, then added one
+    stamp pixel at a time for all of them at once, so the Python work depends
+    on the stamp size, not the particle count. Larger circles are added a
+    stamp slice at a time. The summed light is added to the screen in a
+    single saturating blit; that was faster than adding into
+    pygame.surfarray.pixels3d, which needs a read-modify-write of the
+    screen through a strided view.
+    """
+    # Circles up to this radius are batched by stamp pixel and their stamps cached
+    max_batched_radius = 8
+    
+    # Stamps by radius, shared by every splatter
+    stamps = {}
+    
+    def stamp(self, radius):
+        """Antialiased disc weights for an integer radius
+        
+        Like pygame.draw.circle, the disc is 2 * radius pixels across, so its
+        centre sits half a pixel up and left of the given pixel. The stamp
+        spans offsets -radius - 1 to radius.
+        """
+        offsets = np.arange(-radius - 1, radius + 1) + 0.5
+        dist = np.hypot(offsets[:, None], offsets[None, :])
+        return np.clip(radius + 0.5 - dist, 0, 1).astype(np.float32)
+        
+    def batched_stamp(self, radius):
+        """Cached nonzero pixels of a small stamp as x/y offsets and weights"""
+        if radius not in self.stamps:
+            weights = self.stamp(radius)
+            ox, oy = np.nonzero(weights)
+            self.stamps[radius] = (ox - radius - 1, oy - radius - 1, weights[ox, oy])
+        return self.stamps[radius]
+        
+    def splat(self, screen, xs, ys, radii, colors, alphas):
+        """Add circles to screen
+        
+        xs, ys, radii and alphas (0-1) are length N arrays, colors is N x 3.
+        Centres and radii are truncated to whole pixels like pygame.draw.circle.
+        """
+        xs = xs.astype(int)
+        ys = ys.astype(int)
+        radii = radii.astype(int)
+        width, height = screen.get_size()
+        
+        # Skip empty circles and anything entirely off screen
+        keep = ((radii >= 1) & (xs + radii >= 0) & (xs - radii < width) &
+                (ys + radii >= 0) & (ys - radii < height))
+        if not keep.any():
+            return
+        xs, ys, radii = xs[keep], ys[keep], radii[keep]
+        light = (colors[keep] * alphas[keep, None]).astype(np.float32)
+        
+        # Buffer spans every stamp in full so they never need clipping.
+        # It is stored row-major (y, x) so the result can be handed to
+        # pygame.image.frombuffer without reordering.
+        x0 = int((xs - radii).min()) - 1
+        y0 = int((ys - radii).min()) - 1
+        bw = int((xs + radii).max()) + 1 - x0
+        bh = int((ys + radii).max()) + 1 - y0
+        buffer = np.zeros((bh, bw, 3), dtype=np.float32)
+        
+        small = radii <= self.max_batched_radius
+        flat = buffer.reshape(-1)
+        for radius in np.unique(radii[small]):
+            sel = small & (radii == radius)
+            # Merge circles sharing a centre so each scatter below has no repeats
+            centers, inverse = np.unique((ys[sel] - y0) * bw + (xs[sel] - x0), return_inverse=True)
+            merged = np.empty((len(centers), 3), dtype=np.float32)
+            for c in range(3):
+                merged[:, c] = np.bincount(inverse, light[sel, c], minlength=len(centers))
+            merged = merged.reshape(-1)
+            base = (centers[:, None] * 3 + np.arange(3)).reshape(-1)
+            
+            ox, oy, weights = self.batched_stamp(radius)
+            for offset, weight in zip((oy * bw + ox) * 3, weights):
+                flat[base + offset] += merged * weight
+                
+        for i in np.nonzero(~small)[0]:
+            radius = radii[i]
+            left, top = xs[i] - radius - 1 - x0, ys[i] - radius - 1 - y0
+            size = 2 * radius + 2
+            buffer[top:top + size, left:left + size] += self.stamp(radius)[:, :, None] * light[i]
+            
+        # Crop to the screen, saturate to bytes and add it on in one blit
+        sx0, sy0 = max(0, -x0), max(0, -y0)
+        sx1, sy1 = min(bw, width - x0), min(bh, height - y0)
+        visible = np.empty((sy1 - sy0, sx1 - sx0, 3), dtype=np.uint8)
+        np.minimum(buffer[sy0:sy1, sx0:sx1], 255, out=visible, casting='unsafe')
+        surf = pygame.image.frombuffer(visible, (sx1 - sx0, sy1 - sy0), 'RGB')
+        screen.blit(surf, (x0 + sx0, y0 + sy0), special_flags=pygame.BLEND_RGB_ADD)
+        
 class DrumHitEffect(VisualEffect):
     """Effect that flashes drums at specific positions"""
     def __init__(self, width, height):
@@ -321,12 +626,13 @@ class DrumHitEffect(VisualEffect):
         
 class ParticleEmitterEffect(VisualEffect):
     """Effect that emits particles based on MIDI events"""
-    def __init__(self, width, height, max_particles=200):
+    def __init__(self, width, height, max_particles=200, backend='pygame'):
         super().__init__()
         self.width = width
         self.height = height
         self.max_particles = max_particles
         self.particles = []
+        self.splatter = NumpySplatter() if backend == 'numpy' else None
         
     def reset(self):
         self.particles = []
@@ -410,6 +716,10 @@ class ParticleEmitterEffect(VisualEffect):
         
     def render(self, screen):
         """Render all particles"""
+        if self.splatter:
+            self.render_numpy(screen)
+            return
+            
         for particle in self.particles:
             # Fade particles as they die
             alpha = int((particle['lifetime'] / particle['max_lifetime']) * 255)
@@ -421,19 +731,57 @@ class ParticleEmitterEffect(VisualEffect):
             
             screen.blit(surf, (int(particle['x'] - particle['size']), int(particle['y'] - particle['size'])))
             
+    def render_numpy(self, screen):
+        """Render all particles in one additive splat"""
+        if not self.particles:
+            return
+        particles = np.array([(p['x'], p['y'], p['size'], p['lifetime'] / p['max_lifetime'], *p['color'])
+                              for p in self.particles], dtype=np.float32)
+        # Same whole-pixel centres as blitting a circle at (x - size, y - size)
+        sizes = np.trunc(particles[:, 2])
+        xs = np.trunc(particles[:, 0] - particles[:, 2]) + sizes
+        ys = np.trunc(particles[:, 1] - particles[:, 2]) + sizes
+        self.splatter.splat(screen, xs, ys, sizes, particles[:, 4:], particles[:, 3])
+            
 def main():
     parser = argparse.ArgumentParser(description="R# - MIDI Visualizer")
-    parser.add_argument("midi_file", help="Path to input MIDI file")
+    parser.add_argument("midi_file", nargs="?", help="Path to input MIDI file (replayed as live input with --live)")
     parser.add_argument("--bpm", "-b", type=int, default=120, help="BPM of the track")
     parser.add_argument("--audio", "-a", help="Path to audio file for playback")
+    parser.add_argument("--live", "-l", nargs="?", const="", metavar="PORT",
+                        help="Drive visuals from a MIDI input port (default port if no name given)")
+    parser.add_argument("--virtual", action="store_true", help="Create a virtual input port named by --live")
+    parser.add_argument("--list-ports", action="store_true", help="List MIDI input ports and exit")
+    parser.add_argument("--backend", choices=RENDER_BACKENDS, default="pygame",
+                        help="Particle render backend (numpy is faster with thousands of particles)")
+    parser.add_argument("--max-particles", type=int, default=200, help="Maximum live particles")
     args = parser.parse_args()
     
+    if args.list_ports:
+        for name in mido.get_input_names():
+            print(name)
+        return
+    
+    live_input = None
+    if args.live is not None:
+        if args.midi_file:
+            live_input = LiveMidiInput(replay_file=args.midi_file, bpm=args.bpm)
+        elif args.virtual:
+            live_input = LiveMidiInput(args.live or "R#", virtual=True)
+        else:
+            live_input = LiveMidiInput(args.live or None)
+        if args.audio:
+            parser.error("--audio can't be combined with --live")
+    elif not args.midi_file:
+        parser.error("a MIDI file is required unless --live is given")
+    
     # Create R# instance
-    rsharp = RSharp(args.midi_file, args.audio, args.bpm)
+    rsharp = RSharp(args.midi_file, args.audio, args.bpm, live_input=live_input)
     
     # Add visual effects
     drum_hits = DrumHitEffect(rsharp.screen_width, rsharp.screen_height)
-    particle_emitter = ParticleEmitterEffect(rsharp.screen_width, rsharp.screen_height)
+    particle_emitter = ParticleEmitterEffect(rsharp.screen_width, rsharp.screen_height,
+                                             max_particles=args.max_particles, backend=args.backend)
     
     rsharp.add_visual_effect(drum_hits)
     rsharp.add_visual_effect(particle_emitter)
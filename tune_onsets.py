@@ -0,0 +1,207 @@
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import librosa
+import mido
+import numpy as np
+
+from audio_to_midi import detect_onsets
+
+# Features shared with worker processes, set once per worker by init_worker
+_features = None
+
+def load_reference_onsets(midi_file, merge_window=0.03):
+    """Return sorted note-on times (seconds) from a reference MIDI file.
+
+    Hits closer together than merge_window (e.g. kick and crash on the same
+    beat) count as one onset, since the detector only sees one.
+    """
+    times = []
+    current_time = 0
+    for msg in mido.MidiFile(midi_file):
+        current_time += msg.time
+        if msg.type == 'note_on' and msg.velocity > 0:
+            times.append(current_time)
+
+    onsets = []
+    for t in sorted(times):
+        if not onsets or t - onsets[-1] > merge_window:
+            onsets.append(t)
+    return np.array(onsets)
+
+def compute_features(audio_file, hop_lengths):
+    """Compute onset envelopes for every hop length from one spectrogram.
+
+    The mel spectrogram is computed once at the smallest hop; larger hops
+    (which must be multiples of it) take every k-th frame, which lands on the
+    same frame centres as a direct computation at that hop.
+
+    Returns sr, the envelopes by hop, and the estimated CPU seconds of
+    computing each hop directly. With a fixed FFT size the spectrogram cost
+    is proportional to the frame count, so the estimate scales the timed
+    base spectrogram by base_hop / hop and adds that hop's envelope time.
+    """
+    base_hop = min(hop_lengths)
+    for hop in hop_lengths:
+        if hop % base_hop:
+            raise ValueError(f"Hop length {hop} is not a multiple of {base_hop}")
+
+    y, sr = librosa.load(audio_file)
+    # Warm up librosa's one-off setup so it isn't counted as feature cost
+    librosa.feature.melspectrogram(y=y[:base_hop * 16], sr=sr, hop_length=base_hop)
+    start = time.process_time()
+    S = librosa.feature.melspectrogram(y=y, sr=sr, hop_length=base_hop)
+    spectrogram_time = time.process_time() - start
+
+    envelopes = {}
+    feature_times = {}
+    for hop in hop_lengths:
+        start = time.process_time()
+        # Convert to dB after decimating so top_db clips against the same peak
+        S_db = librosa.power_to_db(S[:, ::hop // base_hop])
+        envelopes[hop] = librosa.onset.onset_strength(S=S_db, sr=sr, hop_length=hop)
+        feature_times[hop] = spectrogram_time * base_hop / hop + time.process_time() - start
+    return sr, envelopes, feature_times
+
+def match_onsets(reference, estimated, tolerance):
+    """Greedily pair sorted onsets within tolerance, returning timing errors."""
+    errors = []
+    i = j = 0
+    while i < len(estimated) and j < len(reference):
+        diff = estimated[i] - reference[j]
+        if abs(diff) <= tolerance:
+            errors.append(diff)
+            i += 1
+            j += 1
+        elif diff < 0:
+            i += 1
+        else:
+            j += 1
+    return errors
+
+def init_worker(features):
+    global _features
+    _features = features
+
+def evaluate_config(config, tolerance):
+    """Run one parameter combination over every file and score it."""
+    hop_length, delta, wait, backtrack = config
+    start = time.process_time()
+
+    matched = detected = expected = 0
+    feature_time = 0.0
+    errors = []
+    for sr, envelopes, feature_times, reference in _features:
+        feature_time += feature_times[hop_length]
+        onset_env = envelopes[hop_length]
+        frames = detect_onsets(onset_env, sr, hop_length, delta, wait, backtrack)
+        estimated = librosa.frames_to_time(frames, sr=sr, hop_length=hop_length)
+
+        file_errors = match_onsets(reference, estimated, tolerance)
+        matched += len(file_errors)
+        detected += len(estimated)
+        expected += len(reference)
+        errors.extend(file_errors)
+
+    detect_time = time.process_time() - start
+    cpu_time = feature_time + detect_time
+    precision = matched / detected if detected else 0.0
+    recall = matched / expected if expected else 0.0
+    f_measure = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+    return {
+        'hop_length': hop_length,
+        'delta': delta,
+        'wait': wait,
+        'backtrack': backtrack,
+        'precision': precision,
+        'recall': recall,
+        'f_measure': f_measure,
+        'timing_error_ms': float(np.mean(np.abs(errors))) * 1000 if errors else float('nan'),
+        'feature_ms': feature_time * 1000,
+        'detect_ms': detect_time * 1000,
+        'cpu_ms': cpu_time * 1000,
+        'f_per_cpu_s': f_measure / cpu_time if cpu_time else float('nan')
+    }
+
+def tune_onsets(pairs, hop_lengths, deltas, waits, backtracks, tolerance=0.05, workers=None):
+    """Evaluate the onset parameter grid against reference MIDI files.
+
+    pairs is a list of (audio_file, reference_midi) tuples. Returns one result
+    per configuration, best F-measure first and cheapest first among ties.
+    cpu_ms is what the configuration would cost in audio_to_midi across all
+    files: feature_ms (estimated spectrogram and envelope at its hop) plus
+    detect_ms (peak picking and scoring). f_per_cpu_s is F-measure per CPU
+    second.
+    """
+    features = []
+    for audio_file, reference_midi in pairs:
+        print(f"Analyzing {audio_file}...")
+        start = time.process_time()
+        sr, envelopes, feature_times = compute_features(audio_file, hop_lengths)
+        elapsed = time.process_time() - start
+        reference = load_reference_onsets(reference_midi)
+        print(f"  {len(reference)} reference onsets, features in {elapsed:.2f}s CPU")
+        features.append((sr, envelopes, feature_times, reference))
+
+    grid = list(itertools.product(hop_lengths, deltas, waits, backtracks))
+    print(f"Evaluating {len(grid)} configurations...")
+
+    # A few chunks per worker keeps the pool busy without per-task overhead
+    chunksize = max(1, len(grid) // (4 * (workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(features,)) as executor:
+        results = list(executor.map(evaluate_config, grid, itertools.repeat(tolerance),
+                                    chunksize=chunksize))
+
+    results.sort(key=lambda r: (-r['f_measure'], r['cpu_ms']))
+    return results
+
+def print_table(results, top=None):
+    """Print a ranked results table"""
+    header = f"{'rank':>4} {'hop':>5} {'delta':>6} {'wait':>6} {'bt':>3} {'prec':>6} {'recall':>6} {'F':>6} {'err ms':>7} {'feat ms':>8} {'cpu ms':>8} {'F/cpu s':>8}"
+    print(header)
+    print("-" * len(header))
+    for rank, r in enumerate(results[:top], start=1):
+        print(f"{rank:>4} {r['hop_length']:>5} {r['delta']:>6.3f} {r['wait']:>6.3f} "
+              f"{'y' if r['backtrack'] else 'n':>3} {r['precision']:>6.3f} {r['recall']:>6.3f} "
+              f"{r['f_measure']:>6.3f} {r['timing_error_ms']:>7.1f} {r['feature_ms']:>8.1f} "
+              f"{r['cpu_ms']:>8.1f} {r['f_per_cpu_s']:>8.2f}")
+
+def save_csv(results, output_file):
+    """Save results as CSV, creating parent directories if needed."""
+    output_dir = os.path.dirname(output_file)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune onset detection parameters against reference MIDI")
+    parser.add_argument("--pair", "-p", nargs=2, action="append", required=True, metavar=("AUDIO", "MIDI"),
+                        help="Audio file and its reference MIDI (repeat for more files)")
+    parser.add_argument("--hop-lengths", type=int, nargs="+", default=[256, 512, 1024], help="Hop lengths to try")
+    parser.add_argument("--deltas", type=float, nargs="+", default=[0.03, 0.05, 0.07, 0.1, 0.15], help="Peak-pick thresholds to try")
+    parser.add_argument("--waits", type=float, nargs="+", default=[0.0, 0.03, 0.06, 0.1], help="Minimum seconds between onsets to try")
+    parser.add_argument("--backtrack", choices=["off", "on", "both"], default="both", help="Backtracking settings to try")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="Match window in seconds")
+    parser.add_argument("--workers", "-j", type=int, help="Worker processes (default: all cores)")
+    parser.add_argument("--top", type=int, default=20, help="Number of rows to print")
+    parser.add_argument("--csv", help="Save the full ranked table to a CSV file")
+
+    args = parser.parse_args()
+
+    backtracks = {"off": [False], "on": [True], "both": [False, True]}[args.backtrack]
+    results = tune_onsets([tuple(p) for p in args.pair], args.hop_lengths, args.deltas, args.waits,
+                          backtracks, args.tolerance, args.workers)
+
+    print_table(results, args.top)
+    if args.csv:
+        save_csv(results, args.csv)
+        print(f"Saved {len(results)} results to {args.csv}")